@@ -1,53 +1,197 @@
+import filecmp
+import functools
 import json
 import os
+import re
+import shutil
 import subprocess
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional, List
+from types import SimpleNamespace
+from typing import IO, Any, Deque, Dict, Optional, List
 
 from mcp.server.fastmcp import FastMCP
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; stdlib json accepts bytes too
+    _loads = json.loads
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; fall back to a full parse
+    ijson = None
+
 ROOT = Path(__file__).resolve().parents[2]  # repo root (adjust if needed)
 
-# Load project MCP config (the anchor file)
 MCP_CONFIG_PATH = ROOT / "mcp" / "mcp.json"
-CONFIG = json.loads(MCP_CONFIG_PATH.read_text(encoding="utf-8"))
 
-OPENAPI_PATH = ROOT / CONFIG["openapi"]
-SNAPSHOTS_DIR = ROOT / CONFIG["openapiSnapshotsDir"]
-IMPLEMENTED_ENDPOINTS_PATH = ROOT / CONFIG["implementedEndpoints"]
-COVERAGE_REPORT_PATH = ROOT / CONFIG["coverageReport"]
-COVERAGE_SCRIPT_PATH = ROOT / CONFIG["coverageScript"]
+_HTTP_METHODS = frozenset(("get", "post", "put", "delete", "patch", "head", "options"))
+
+# {paramName} placeholders in an OpenAPI/implemented path
+_PARAM_RE = re.compile(r'\{[^}]+\}')
+# new("METHOD", "/path", "Api", "Method") entries in ImplementedEndpoints.cs
+_IMPL_RE = re.compile(r'new\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)')
 
 mcp = FastMCP("lichess-mcp")
 
 
+@functools.cache
+def _config() -> SimpleNamespace:
+    """Load the project MCP config (the anchor file) on first use and resolve its paths."""
+    config = json.loads(MCP_CONFIG_PATH.read_text(encoding="utf-8"))
+    return SimpleNamespace(
+        openapi_path=ROOT / config["openapi"],
+        snapshots_dir=ROOT / config["openapiSnapshotsDir"],
+        implemented_endpoints_path=ROOT / config["implementedEndpoints"],
+        coverage_report_path=ROOT / config["coverageReport"],
+        coverage_script_path=ROOT / config["coverageScript"],
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _coverage_script_exists() -> bool:
+    # Checked once per process; restart the server if the script is added mid-session.
+    return _config().coverage_script_path.exists()
+
+
+@functools.lru_cache(maxsize=16)
+def _load_openapi_cached(path_str: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    # mtime_ns and size are only part of the cache key so edits to the file bust the cache.
+    return _loads(Path(path_str).read_bytes())
+
+
 def _load_openapi(path: Path) -> Dict[str, Any]:
-    return json.loads(path.read_text(encoding="utf-8"))
+    st = path.stat()
+    return _load_openapi_cached(str(path), st.st_mtime_ns, st.st_size)
 
 
 def _op_key(method: str, path: str) -> str:
     return f"{method.upper()} {path}"
 
 
+@dataclass(frozen=True)
+class _OpsIndex:
+    """Lookup tables over the operations of one version of the OpenAPI spec."""
+
+    paths: Dict[str, Any]
+    by_key: Dict[tuple[str, str], Dict[str, Any]]  # (METHOD, path) -> operation entry
+    by_tag: Dict[str, List[tuple[str, str]]]
+    all_keys_sorted: List[tuple[str, str]]
+    normalized_keys: set[tuple[str, str]]  # (METHOD, normalized path)
+    active_normalized_keys: set[tuple[str, str]]  # excludes deprecated operations
+
+
+@functools.lru_cache(maxsize=4)
+def _ops_index(mtime_ns: int, size: int) -> _OpsIndex:
+    paths = _load_openapi_cached(str(_config().openapi_path), mtime_ns, size).get("paths", {})
+
+    by_key: Dict[tuple[str, str], Dict[str, Any]] = {}
+    by_tag: Dict[str, List[tuple[str, str]]] = {}
+    normalized_keys: set[tuple[str, str]] = set()
+    active_normalized_keys: set[tuple[str, str]] = set()
+    for p, item in paths.items():
+        for method, op in item.items():
+            if method not in _HTTP_METHODS:
+                continue
+            method = method.upper()
+            key = (method, p)
+            op_key = _op_key(method, p)
+            # Tags repeat across most operations; intern them so the index shares one copy each.
+            tags = [sys.intern(t) for t in op.get("tags", [])]
+            deprecated = bool(op.get("deprecated", False))
+            normalized_path = _normalize_path(p)
+            by_key[key] = {
+                "key": op_key,
+                "path": p,
+                "method": method,
+                "op": op,
+                "summary": op.get("summary"),
+                "tags": tags,
+                "deprecated": deprecated,
+                "normalizedPath": normalized_path,
+            }
+            for t in dict.fromkeys(tags):  # a tag repeated on one operation still lists it once
+                by_tag.setdefault(t, []).append(key)
+
+            normalized_key = (method, normalized_path)
+            normalized_keys.add(normalized_key)
+            if not deprecated:
+                active_normalized_keys.add(normalized_key)
+
+    for keys in by_tag.values():
+        keys.sort()
+
+    return _OpsIndex(
+        paths=paths,
+        by_key=by_key,
+        by_tag=by_tag,
+        all_keys_sorted=sorted(by_key),
+        normalized_keys=normalized_keys,
+        active_normalized_keys=active_normalized_keys,
+    )
+
+
+def _current_ops_index() -> _OpsIndex:
+    st = _config().openapi_path.stat()
+    return _ops_index(st.st_mtime_ns, st.st_size)
+
+
+_WATCH_INTERVAL_SECONDS = 2.0
+
+
+def _watch_openapi(stop: threading.Event) -> None:
+    """Poll the OpenAPI spec and rebuild the operations index as soon as it changes."""
+    last = None
+    while True:
+        try:
+            st = _config().openapi_path.stat()
+            current = (st.st_mtime_ns, st.st_size)
+            if current != last:
+                last = current
+                _ops_index(*current)
+        except Exception:
+            # A missing or half-written spec is reported by the next tool call instead.
+            pass
+        if stop.wait(_WATCH_INTERVAL_SECONDS):
+            return
+
+
+@functools.lru_cache(maxsize=1)
+def _openapi_text(mtime_ns: int, size: int) -> str:
+    return _config().openapi_path.read_text(encoding="utf-8")
+
+
 @mcp.resource("lichess://openapi")
 def openapi_resource() -> str:
     """Return the current Lichess OpenAPI spec JSON as a string."""
-    return OPENAPI_PATH.read_text(encoding="utf-8")
+    # Kept as str: FastMCP serves bytes as a base64 blob rather than text.
+    st = _config().openapi_path.stat()
+    return _openapi_text(st.st_mtime_ns, st.st_size)
 
 
 @mcp.resource("lichess://coverage")
 def coverage_resource() -> str:
     """Return the current endpoint coverage report markdown (if it exists)."""
-    if not COVERAGE_REPORT_PATH.exists():
+    report_path = _config().coverage_report_path
+    if not report_path.exists():
         return "# Endpoint coverage report not generated yet.\n"
-    return COVERAGE_REPORT_PATH.read_text(encoding="utf-8")
+    return report_path.read_text(encoding="utf-8")
 
 
 @mcp.tool()
 def get_openapi_version() -> Dict[str, Any]:
     """Return the OpenAPI spec info.version and title."""
-    spec = _load_openapi(OPENAPI_PATH)
-    info = spec.get("info", {})
+    if ijson is not None:
+        # Stream just the top-level info object instead of parsing the whole spec.
+        with _config().openapi_path.open("rb") as f:
+            info = next(ijson.items(f, "info"), {})
+    else:
+        info = _load_openapi(_config().openapi_path).get("info", {})
     return {
         "title": info.get("title"),
         "version": info.get("version"),
@@ -60,15 +204,18 @@ def get_operation(method: str, path: str) -> Dict[str, Any]:
     Lookup a single operation from the OpenAPI spec by HTTP method and path.
     Returns summary, tags, deprecated, parameters, requestBody schema (if any), and response codes.
     """
-    spec = _load_openapi(OPENAPI_PATH)
-    paths = spec.get("paths", {})
-    path_item = paths.get(path)
-    if not path_item:
-        return {"found": False, "error": f"Path not found: {path}"}
-
-    op = path_item.get(method.lower())
-    if not op:
-        return {"found": False, "error": f"Method not found: {method.upper()} {path}"}
+    idx = _current_ops_index()
+    entry = idx.by_key.get((method.upper(), path))
+    if entry is not None:
+        op = entry["op"]
+    else:
+        # The index only holds _HTTP_METHODS; look up anything else (e.g. trace) in the spec itself.
+        path_item = idx.paths.get(path)
+        if not path_item:
+            return {"found": False, "error": f"Path not found: {path}"}
+        op = path_item.get(method.lower())
+        if not op:
+            return {"found": False, "error": f"Method not found: {method.upper()} {path}"}
 
     # Lightly normalize the payload to keep it model-friendly.
     responses = op.get("responses", {})
@@ -92,27 +239,21 @@ def list_operations(tag: Optional[str] = None, include_deprecated: bool = False)
     """
     List all operations in the OpenAPI spec, optionally filtered by tag.
     """
-    spec = _load_openapi(OPENAPI_PATH)
-    paths = spec.get("paths", {})
+    idx = _current_ops_index()
+    keys = idx.by_tag.get(sys.intern(tag), []) if tag else idx.all_keys_sorted
 
     ops: List[Dict[str, Any]] = []
-    for p, item in paths.items():
-        for method in ["get", "post", "put", "delete", "patch", "head", "options"]:
-            if method in item:
-                op = item[method]
-                if (not include_deprecated) and op.get("deprecated", False):
-                    continue
-                tags = op.get("tags", [])
-                if tag and tag not in tags:
-                    continue
-                ops.append({
-                    "key": _op_key(method, p),
-                    "summary": op.get("summary"),
-                    "tags": tags,
-                    "deprecated": bool(op.get("deprecated", False)),
-                })
-
-    ops.sort(key=lambda x: x["key"])
+    for key in keys:
+        entry = idx.by_key[key]
+        if (not include_deprecated) and entry["deprecated"]:
+            continue
+        ops.append({
+            "key": entry["key"],
+            "summary": entry["summary"],
+            "tags": list(entry["tags"]),  # copy so callers can't mutate the cached index
+            "deprecated": entry["deprecated"],
+        })
+
     return {"count": len(ops), "operations": ops}
 
 
@@ -122,56 +263,63 @@ def diff_openapi_versions(from_version: str, to_version: str) -> Dict[str, Any]:
     Compare two snapshot specs (e.g., 2.0.106 -> 2.0.107) and return added/removed operation keys.
     Snapshots must be saved as: openapi/snapshots/lichess.openapi.<version>.json
     """
-    a = SNAPSHOTS_DIR / f"lichess.openapi.{from_version}.json"
-    b = SNAPSHOTS_DIR / f"lichess.openapi.{to_version}.json"
+    snapshots_dir = _config().snapshots_dir
+    a = snapshots_dir / f"lichess.openapi.{from_version}.json"
+    b = snapshots_dir / f"lichess.openapi.{to_version}.json"
 
     if not a.exists():
         return {"ok": False, "error": f"Snapshot not found: {a}"}
     if not b.exists():
         return {"ok": False, "error": f"Snapshot not found: {b}"}
 
+    # Identical snapshots (e.g. CI reruns) can't differ; skip parsing them.
+    if filecmp.cmp(a, b, shallow=False):
+        return {"ok": True, "from": from_version, "to": to_version, "added": [], "removed": []}
+
     spec_a = _load_openapi(a)
     spec_b = _load_openapi(b)
 
     def collect(spec: Dict[str, Any]) -> set[str]:
-        out = set()
-        for p, item in spec.get("paths", {}).items():
-            for method in item.keys():
-                out.add(_op_key(method, p))
-        return out
+        return {_op_key(method, p) for p, item in spec.get("paths", {}).items() for method in item}
 
     ops_a = collect(spec_a)
     ops_b = collect(spec_b)
 
-    added = sorted(list(ops_b - ops_a))
-    removed = sorted(list(ops_a - ops_b))
+    if ops_a == ops_b:
+        return {"ok": True, "from": from_version, "to": to_version, "added": [], "removed": []}
+
+    added = sorted(ops_b - ops_a)
+    removed = sorted(ops_a - ops_b)
 
     return {"ok": True, "from": from_version, "to": to_version, "added": added, "removed": removed}
 
 
+@functools.lru_cache(maxsize=4096)
 def _normalize_path(path: str) -> str:
     """Normalize path parameters to a canonical form for comparison.
 
     Converts {paramName} to {param} to handle naming differences between
     OpenAPI spec and our implementation (e.g., {broadcastTournamentId} vs {tournamentId}).
     """
-    import re
     # Replace any {word} with just {param} for comparison
-    return re.sub(r'\{[^}]+\}', '{param}', path)
+    return _PARAM_RE.sub('{param}', path)
 
 
-def _parse_implemented_endpoints() -> Dict[str, Dict[str, str]]:
-    """Parse ImplementedEndpoints.cs and return a dict of key -> {api, method}."""
-    import re
-    if not IMPLEMENTED_ENDPOINTS_PATH.exists():
+def _parse_implemented_endpoints() -> Dict[tuple[str, str], Dict[str, str]]:
+    """Parse ImplementedEndpoints.cs and return a dict of (METHOD, path) -> {api, method}."""
+    impl_path = _config().implemented_endpoints_path
+    if not impl_path.exists():
         return {}
+    return _parse_implemented_endpoints_cached(impl_path.stat().st_mtime_ns)
+
 
-    content = IMPLEMENTED_ENDPOINTS_PATH.read_text(encoding="utf-8")
-    pattern = r'new\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'
-    matches = re.findall(pattern, content)
+@functools.lru_cache(maxsize=4)
+def _parse_implemented_endpoints_cached(mtime_ns: int) -> Dict[tuple[str, str], Dict[str, str]]:
+    content = _config().implemented_endpoints_path.read_text(encoding="utf-8")
+    matches = _IMPL_RE.findall(content)
 
     return {
-        f"{m[0]} {m[1]}": {"api": m[2], "method": m[3], "path": m[1]}
+        (m[0], m[1]): {"api": m[2], "method": m[3]}
         for m in matches
     }
 
@@ -187,39 +335,29 @@ def get_coverage_gaps(include_deprecated: bool = False) -> Dict[str, Any]:
     - extra: Endpoints implemented but not in OpenAPI (external APIs like explorer/tablebase)
     - stats: Summary statistics
     """
-    spec = _load_openapi(OPENAPI_PATH)
-    paths = spec.get("paths", {})
+    idx = _current_ops_index()
 
     # Collect OpenAPI operations
-    openapi_ops: Dict[str, Dict[str, Any]] = {}
-    for p, item in paths.items():
-        for method in ["get", "post", "put", "delete", "patch", "head", "options"]:
-            if method in item:
-                op = item[method]
-                if (not include_deprecated) and op.get("deprecated", False):
-                    continue
-                key = _op_key(method, p)
-                openapi_ops[key] = {
-                    "key": key,
-                    "path": p,
-                    "method": method.upper(),
-                    "summary": op.get("summary"),
-                    "tags": op.get("tags", []),
-                    "deprecated": bool(op.get("deprecated", False)),
-                    "normalizedPath": _normalize_path(p),
-                }
+    # Walk the index in sorted key order so missing/pathVariations come out sorted.
+    openapi_ops: Dict[tuple[str, str], Dict[str, Any]] = {
+        key: idx.by_key[key] for key in idx.all_keys_sorted
+        if include_deprecated or not idx.by_key[key]["deprecated"]
+    }
 
     # Get implemented endpoints
     implemented = _parse_implemented_endpoints()
 
     # Build normalized lookup for implemented endpoints
-    impl_normalized: Dict[str, str] = {}
-    for key, info in implemented.items():
-        method, path = key.split(" ", 1)
-        normalized = f"{method} {_normalize_path(path)}"
+    impl_normalized: Dict[tuple[str, str], tuple[str, str]] = {}
+    impl_norm_map: Dict[tuple[str, str], tuple[str, str]] = {}  # implemented key -> normalized key
+    for key in implemented:
+        method, path = key
+        normalized = (method, _normalize_path(path))
+        impl_norm_map[key] = normalized
         impl_normalized[normalized] = key
 
-    # Categorize gaps
+    # Categorize gaps. Response dicts get their own copy of tags so callers can't
+    # mutate the cached index.
     missing: List[Dict[str, Any]] = []
     path_variations: List[Dict[str, Any]] = []
 
@@ -228,39 +366,32 @@ def get_coverage_gaps(include_deprecated: bool = False) -> Dict[str, Any]:
             continue  # Exact match - implemented
 
         # Check for path variation match
-        method = op["method"]
-        normalized_key = f"{method} {op['normalizedPath']}"
+        normalized_key = (op["method"], op["normalizedPath"])
 
         if normalized_key in impl_normalized:
-            impl_key = impl_normalized[normalized_key]
             path_variations.append({
-                "openapi": key,
-                "implemented": impl_key,
+                "openapi": op["key"],
+                "implemented": _op_key(*impl_normalized[normalized_key]),
                 "summary": op["summary"],
-                "tags": op["tags"],
+                "tags": list(op["tags"]),
             })
         else:
             missing.append({
-                "key": key,
+                "key": op["key"],
                 "summary": op["summary"],
-                "tags": op["tags"],
+                "tags": list(op["tags"]),
                 "deprecated": op["deprecated"],
             })
 
-    # Find extra (implemented but not in OpenAPI - external APIs)
-    extra: List[Dict[str, Any]] = []
-    openapi_normalized = {f"{op['method']} {op['normalizedPath']}" for op in openapi_ops.values()}
+    # Find extra (implemented but not in OpenAPI - external APIs). Rows are kept as
+    # tuples, sort key first, and only turned into dicts when building the response.
+    extra: List[tuple[tuple[str, str], str, str]] = []
+    openapi_normalized = idx.normalized_keys if include_deprecated else idx.active_normalized_keys
 
     for key, info in implemented.items():
         if key not in openapi_ops:
-            method, path = key.split(" ", 1)
-            normalized = f"{method} {_normalize_path(path)}"
-            if normalized not in openapi_normalized:
-                extra.append({
-                    "key": key,
-                    "api": info["api"],
-                    "method": info["method"],
-                })
+            if impl_norm_map[key] not in openapi_normalized:
+                extra.append((key, info["api"], info["method"]))
 
     return {
         "stats": {
@@ -270,51 +401,86 @@ def get_coverage_gaps(include_deprecated: bool = False) -> Dict[str, Any]:
             "pathVariationsCount": len(path_variations),
             "extraCount": len(extra),
         },
-        "missing": sorted(missing, key=lambda x: x["key"]),
-        "pathVariations": sorted(path_variations, key=lambda x: x["openapi"]),
-        "extra": sorted(extra, key=lambda x: x["key"]),
+        "missing": missing,
+        "pathVariations": path_variations,
+        "extra": [
+            {"key": _op_key(*k), "api": api, "method": method}
+            for k, api, method in sorted(extra)
+        ],
     }
 
 
+@functools.lru_cache(maxsize=1)
+def _powershell_exe() -> Optional[str]:
+    """Prefer pwsh (PowerShell 7+), falling back to powershell (Windows PowerShell 5)."""
+    return shutil.which("pwsh") or shutil.which("powershell")
+
+
+def _read_tail(stream: IO[str], limit: int) -> str:
+    """Drain a text stream, keeping only its last `limit` characters in memory."""
+    chunks: Deque[str] = deque()
+    size = 0
+    for chunk in iter(lambda: stream.read(8192), ""):
+        chunks.append(chunk)
+        size += len(chunk)
+        while size - len(chunks[0]) >= limit:
+            size -= len(chunks.popleft())
+    return "".join(chunks)[-limit:]
+
+
+def _run_with_tail(cmd: List[str], limit: int) -> tuple[int, str, str]:
+    """Run cmd from the repo root and return (exit code, stdout tail, stderr tail)."""
+    with subprocess.Popen(
+        cmd,
+        cwd=str(ROOT),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    ) as proc:
+        # Drain stderr on a separate thread so neither pipe can fill up and block the script.
+        stderr_tail: List[str] = []
+        stderr_reader = threading.Thread(
+            target=lambda: stderr_tail.append(_read_tail(proc.stderr, limit)),
+            daemon=True,
+        )
+        stderr_reader.start()
+        stdout_tail = _read_tail(proc.stdout, limit)
+        stderr_reader.join()
+        returncode = proc.wait()
+    return returncode, stdout_tail, stderr_tail[0]
+
+
 @mcp.tool()
 def generate_coverage_report() -> Dict[str, Any]:
     """
     Run the repo's coverage generator script to update docs/api-coverage.md.
     Tries pwsh (PowerShell 7+) first, then falls back to powershell (Windows PowerShell 5).
     """
-    if not COVERAGE_SCRIPT_PATH.exists():
-        return {"ok": False, "error": f"Coverage script not found: {COVERAGE_SCRIPT_PATH}"}
+    cfg = _config()
+    if not _coverage_script_exists():
+        return {"ok": False, "error": f"Coverage script not found: {cfg.coverage_script_path}"}
 
-    # Try pwsh first (PowerShell 7+), then fall back to powershell (Windows PowerShell 5)
-    ps_commands = [
-        ["pwsh", "-ExecutionPolicy", "Bypass", "-File", str(COVERAGE_SCRIPT_PATH)],
-        ["powershell", "-ExecutionPolicy", "Bypass", "-File", str(COVERAGE_SCRIPT_PATH)],
-    ]
+    exe = _powershell_exe()
+    if not exe:
+        return {"ok": False, "error": "PowerShell not found. Tried pwsh and powershell."}
 
-    last_error = None
-    for cmd in ps_commands:
-        try:
-            result = subprocess.run(
-                cmd,
-                cwd=str(ROOT),
-                capture_output=True,
-                text=True,
-                check=False,
-            )
-            return {
-                "ok": result.returncode == 0,
-                "exitCode": result.returncode,
-                "stdout": result.stdout[-4000:],  # keep it model-friendly
-                "stderr": result.stderr[-4000:],
-                "coverageReportPath": str(COVERAGE_REPORT_PATH),
-            }
-        except FileNotFoundError:
-            last_error = f"{cmd[0]} not found"
-            continue
-
-    return {"ok": False, "error": f"PowerShell not found. Tried pwsh and powershell. Last error: {last_error}"}
+    cmd = [exe, "-ExecutionPolicy", "Bypass", "-File", str(cfg.coverage_script_path)]
+    returncode, stdout, stderr = _run_with_tail(cmd, 4000)  # keep it model-friendly
+    return {
+        "ok": returncode == 0,
+        "exitCode": returncode,
+        "stdout": stdout,
+        "stderr": stderr,
+        "coverageReportPath": str(cfg.coverage_report_path),
+    }
 
 
 if __name__ == "__main__":
-    # stdio transport is the common local integration path
-    mcp.run()
+    # Keep the operations index warm so the first tool call after a spec update stays fast.
+    stop_watching = threading.Event()
+    threading.Thread(target=_watch_openapi, args=(stop_watching,), daemon=True).start()
+    try:
+        # stdio transport is the common local integration path
+        mcp.run()
+    finally:
+        stop_watching.set()